@@ -0,0 +1,55 @@
+"""HyperLogLog-скетчи для приблизительного подсчёта уникальных зрителей.
+
+Скетч хранится как 4096 однобайтовых регистров (4 КБ в колонке bytea),
+стандартная ошибка оценки около 1.6% при любом числе зрителей.
+"""
+import hashlib
+import math
+
+HLL_P = 12
+HLL_M = 1 << HLL_P
+_ALPHA = 0.7213 / (1 + 1.079 / HLL_M)
+_TAIL_BITS = 64 - HLL_P
+
+
+def empty() -> bytearray:
+    return bytearray(HLL_M)
+
+
+def load(data) -> bytearray:
+    """Скетч из значения bytea; пустое или повреждённое значение даёт пустой скетч"""
+    if not data or len(data) != HLL_M:
+        return empty()
+    return bytearray(data)
+
+
+def add(sketch: bytearray, item: str) -> bool:
+    """Добавляет элемент; возвращает True, если скетч изменился"""
+    h = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), 'big')
+    index = h >> _TAIL_BITS
+    rank = _TAIL_BITS - (h & ((1 << _TAIL_BITS) - 1)).bit_length() + 1
+    if rank > sketch[index]:
+        sketch[index] = rank
+        return True
+    return False
+
+
+def merge(target: bytearray, other) -> bytearray:
+    """Объединяет other в target (поэлементный максимум регистров)"""
+    for i, value in enumerate(other):
+        if value > target[i]:
+            target[i] = value
+    return target
+
+
+def estimate(sketch) -> int:
+    zeros = 0
+    total = 0.0
+    for value in sketch:
+        total += 2.0 ** -value
+        if value == 0:
+            zeros += 1
+    result = _ALPHA * HLL_M * HLL_M / total
+    if result <= 2.5 * HLL_M and zeros:
+        result = HLL_M * math.log(HLL_M / zeros)
+    return int(round(result))
@@ -1,6 +1,176 @@
 import json
 import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
 import psycopg2
+import hll
+
+VIEW_DEDUP_WINDOW = int(os.environ.get('VIEW_DEDUP_WINDOW', '1800'))
+VIEW_DEDUP_BUCKET = 60
+VIEW_DEDUP_MAX_KEYS = 100000
+VIEW_DEDUP_PURGE_BATCH = 1000
+
+COMMENTS_PAGE_SIZE = 20
+COMMENTS_MAX_PAGE_SIZE = 100
+
+
+class ViewDedup:
+    """Окно дедупликации просмотров в памяти процесса.
+
+    Ключи (зритель, видео) раскладываются по минутным корзинам; корзины старше
+    окна выбрасываются целиком, а при превышении лимита ключей вытесняются
+    самые старые корзины (а в текущей — самые старые ключи), поэтому память
+    ограничена сверху.
+    """
+
+    def __init__(self, window: int, bucket_size: int, max_keys: int):
+        self.window = window
+        self.bucket_size = bucket_size
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'durable_hits': 0, 'misses': 0}
+
+    def _evict(self, now: float):
+        oldest = int((now - self.window) // self.bucket_size)
+        current = int(now // self.bucket_size)
+        while self.buckets:
+            bucket, keys = next(iter(self.buckets.items()))
+            if bucket > oldest and (self.size <= self.max_keys or bucket == current):
+                break
+            self.buckets.popitem(last=False)
+            self.size -= len(keys)
+        # Текущую корзину целиком не выбрасываем: при всплеске вытесняем её старейшие ключи
+        keys = self.buckets.get(current)
+        while keys and self.size > self.max_keys:
+            del keys[next(iter(keys))]
+            self.size -= 1
+
+    def lookup(self, key: tuple):
+        """Возвращает запомненный views_count, если просмотр уже был в окне"""
+        now = time.time()
+        with self.lock:
+            self._evict(now)
+            for keys in self.buckets.values():
+                if key in keys:
+                    self.stats['memory_hits'] += 1
+                    return keys[key]
+        return None
+
+    def remember(self, key: tuple, views_count: int, durable_hit: bool = False):
+        now = time.time()
+        bucket = int(now // self.bucket_size)
+        with self.lock:
+            self.stats['durable_hits' if durable_hit else 'misses'] += 1
+            keys = self.buckets.get(bucket)
+            if keys is None:
+                keys = self.buckets[bucket] = {}
+            if key not in keys:
+                self.size += 1
+            keys[key] = views_count
+            self._evict(now)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['tracked_keys'] = self.size
+        total = stats['memory_hits'] + stats['durable_hits'] + stats['misses']
+        hits = stats['memory_hits'] + stats['durable_hits']
+        stats['hit_rate'] = round(hits / total, 4) if total else 0.0
+        stats['window_seconds'] = self.window
+        return stats
+
+
+view_dedup = ViewDedup(VIEW_DEDUP_WINDOW, VIEW_DEDUP_BUCKET, VIEW_DEDUP_MAX_KEYS)
+_last_dedup_cleanup = 0.0
+
+
+def encode_comment_cursor(created_at: datetime, comment_id: int) -> str:
+    return f'{created_at.isoformat()}_{comment_id}'
+
+
+def decode_comment_cursor(cursor: str):
+    """Курсор вида <created_at>_<id> для keyset-пагинации комментариев.
+
+    Некорректный курсор приводит к ValueError.
+    """
+    if not cursor:
+        return None
+    created_at, separator, comment_id = cursor.rpartition('_')
+    if not separator:
+        raise ValueError('malformed cursor')
+    return datetime.fromisoformat(created_at), int(comment_id)
+
+
+def viewer_fingerprint(event: dict, user_id) -> str:
+    """Отпечаток зрителя: id пользователя или хэш IP и User-Agent для анонимов"""
+    if user_id:
+        return f'u:{user_id}'
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    # Крайний правый адрес дописан ближайшим прокси; левые клиент может подделать
+    ip = headers.get('x-forwarded-for', '').split(',')[-1].strip() or identity.get('sourceIp', '')
+    agent = headers.get('user-agent', '')
+    if not ip and not agent:
+        return None
+    return 'a:' + hashlib.sha256(f'{ip}|{agent}'.encode()).hexdigest()[:32]
+
+
+def update_viewer_sketches(cur, video_id, viewers_hll, fingerprint: str):
+    """Добавляет зрителя в общий и дневной скетч видео.
+
+    Строка videos уже заблокирована UPDATE счётчика просмотров, дневная строка
+    блокируется SELECT ... FOR UPDATE, поэтому read-modify-write скетчей безопасен.
+    Запись происходит только если регистры скетча действительно изменились.
+    """
+    sketch = hll.load(viewers_hll)
+    if hll.add(sketch, fingerprint):
+        cur.execute(
+            "UPDATE videos SET viewers_hll = %s, unique_viewers = %s WHERE id = %s",
+            (psycopg2.Binary(bytes(sketch)), hll.estimate(sketch), video_id)
+        )
+    
+    cur.execute("""
+        INSERT INTO video_viewers_daily (video_id, day, sketch)
+        VALUES (%s, CURRENT_DATE, NULL)
+        ON CONFLICT (video_id, day) DO NOTHING
+    """, (video_id,))
+    cur.execute(
+        "SELECT day, sketch FROM video_viewers_daily WHERE video_id = %s AND day = CURRENT_DATE FOR UPDATE",
+        (video_id,)
+    )
+    day, daily = cur.fetchone()
+    sketch = hll.load(daily)
+    if hll.add(sketch, fingerprint):
+        cur.execute(
+            "UPDATE video_viewers_daily SET sketch = %s WHERE video_id = %s AND day = %s",
+            (psycopg2.Binary(bytes(sketch)), video_id, day)
+        )
+
+
+def purge_view_dedup(cur):
+    """Удаляет устаревшие строки view_dedup не больше VIEW_DEDUP_PURGE_BATCH за запрос.
+
+    Пока пачка заполняется целиком, отметка времени не сдвигается и следующий
+    просмотр удалит ещё одну пачку.
+    """
+    global _last_dedup_cleanup
+    if time.time() - _last_dedup_cleanup <= VIEW_DEDUP_WINDOW:
+        return
+    cur.execute("""
+        DELETE FROM view_dedup WHERE ctid IN (
+            SELECT ctid FROM view_dedup
+            WHERE seen_at < NOW() - make_interval(secs => %s)
+            LIMIT %s
+        )
+    """, (VIEW_DEDUP_WINDOW, VIEW_DEDUP_PURGE_BATCH))
+    if cur.rowcount < VIEW_DEDUP_PURGE_BATCH:
+        _last_dedup_cleanup = time.time()
+
 
 def handler(event: dict, context) -> dict:
     """API для лайков, подписок, комментариев и просмотров"""
@@ -26,6 +196,26 @@ def handler(event: dict, context) -> dict:
         params = event.get('queryStringParameters') or {}
         action = body.get('action') or params.get('action')
         
+        if action == 'view' and body.get('video_id'):
+            fingerprint = viewer_fingerprint(event, body.get('user_id'))
+            if fingerprint:
+                views_count = view_dedup.lookup((fingerprint, str(body['video_id'])))
+                if views_count is not None:
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'success': True, 'views_count': views_count, 'counted': False}),
+                        'isBase64Encoded': False
+                    }
+        
+        if action == 'view_stats':
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(view_dedup.snapshot()),
+                'isBase64Encoded': False
+            }
+        
         conn = psycopg2.connect(dsn)
         cur = conn.cursor()
         
@@ -135,16 +325,59 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute("""
-                    SELECT c.id, c.content, c.created_at, 
+                parent_id = params.get('parent_id')
+                try:
+                    limit = min(max(int(params.get('limit', COMMENTS_PAGE_SIZE)), 1), COMMENTS_MAX_PAGE_SIZE)
+                    cursor = decode_comment_cursor(params.get('cursor'))
+                except ValueError:
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid cursor or limit'}),
+                        'isBase64Encoded': False
+                    }
+                
+                query = """
+                    SELECT c.id, c.content, c.created_at, c.parent_id, c.reply_count,
                            u.id, u.username, u.display_name, u.avatar_url
                     FROM comments c
                     JOIN users u ON c.user_id = u.id
-                    WHERE c.video_id = %s
-                    ORDER BY c.created_at DESC
-                """, (video_id,))
+                """
+                if parent_id:
+                    query += " WHERE c.parent_id = %s"
+                    query_params = [parent_id]
+                    if cursor:
+                        query += " AND (c.created_at, c.id) > (%s, %s)"
+                        query_params.extend(cursor)
+                    query += " ORDER BY c.created_at, c.id LIMIT %s"
+                else:
+                    query += " WHERE c.video_id = %s AND c.parent_id IS NULL"
+                    query_params = [video_id]
+                    if cursor:
+                        query += " AND (c.created_at, c.id) < (%s, %s)"
+                        query_params.extend(cursor)
+                    query += " ORDER BY c.created_at DESC, c.id DESC LIMIT %s"
+                query_params.append(limit + 1)
                 
+                cur.execute(query, query_params)
                 comments = cur.fetchall()
+                
+                next_cursor = None
+                if len(comments) > limit:
+                    comments = comments[:limit]
+                    next_cursor = encode_comment_cursor(comments[-1][2], comments[-1][0])
+                
+                total_count = None
+                if not cursor:
+                    if parent_id:
+                        cur.execute("SELECT reply_count FROM comments WHERE id = %s", (parent_id,))
+                    else:
+                        cur.execute("SELECT COUNT(*) FROM comments WHERE video_id = %s", (video_id,))
+                    row = cur.fetchone()
+                    total_count = row[0] if row else 0
+                
                 result = []
                 
                 for comment in comments:
@@ -152,11 +385,13 @@ def handler(event: dict, context) -> dict:
                         'id': comment[0],
                         'content': comment[1],
                         'created_at': comment[2].isoformat(),
+                        'parent_id': comment[3],
+                        'reply_count': comment[4],
                         'user': {
-                            'id': comment[3],
-                            'username': comment[4],
-                            'display_name': comment[5],
-                            'avatar_url': comment[6]
+                            'id': comment[5],
+                            'username': comment[6],
+                            'display_name': comment[7],
+                            'avatar_url': comment[8]
                         }
                     })
                 
@@ -166,7 +401,7 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'comments': result}),
+                    'body': json.dumps({'comments': result, 'next_cursor': next_cursor, 'total_count': total_count}),
                     'isBase64Encoded': False
                 }
             
@@ -185,11 +420,29 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
+                parent_id = body.get('parent_id')
+                
+                if parent_id:
+                    cur.execute(
+                        "UPDATE comments SET reply_count = reply_count + 1 WHERE id = %s AND video_id = %s RETURNING id",
+                        (parent_id, video_id)
+                    )
+                    if not cur.fetchone():
+                        conn.rollback()
+                        cur.close()
+                        conn.close()
+                        return {
+                            'statusCode': 404,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'body': json.dumps({'error': 'Parent comment not found'}),
+                            'isBase64Encoded': False
+                        }
+                
                 cur.execute("""
-                    INSERT INTO comments (video_id, user_id, content)
-                    VALUES (%s, %s, %s)
+                    INSERT INTO comments (video_id, user_id, content, parent_id)
+                    VALUES (%s, %s, %s, %s)
                     RETURNING id, created_at
-                """, (video_id, user_id, content))
+                """, (video_id, user_id, content, parent_id))
                 
                 comment = cur.fetchone()
                 conn.commit()
@@ -197,6 +450,7 @@ def handler(event: dict, context) -> dict:
                 result = {
                     'success': True,
                     'comment_id': comment[0],
+                    'parent_id': parent_id,
                     'created_at': comment[1].isoformat()
                 }
                 
@@ -224,18 +478,42 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(
-                "INSERT INTO views (video_id, user_id) VALUES (%s, %s)",
-                (video_id, user_id)
-            )
-            cur.execute(
-                "UPDATE videos SET views_count = views_count + 1 WHERE id = %s RETURNING views_count",
-                (video_id,)
-            )
-            views_count = cur.fetchone()[0]
+            fingerprint = viewer_fingerprint(event, user_id)
+            counted = True
+            
+            if fingerprint:
+                cur.execute("""
+                    INSERT INTO view_dedup (fingerprint, video_id, seen_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (fingerprint, video_id) DO UPDATE SET seen_at = NOW()
+                    WHERE view_dedup.seen_at < NOW() - make_interval(secs => %s)
+                    RETURNING seen_at
+                """, (fingerprint, video_id, VIEW_DEDUP_WINDOW))
+                counted = cur.fetchone() is not None
+            
+            if counted:
+                cur.execute(
+                    "INSERT INTO views (video_id, user_id, fingerprint) VALUES (%s, %s, %s)",
+                    (video_id, user_id, fingerprint)
+                )
+                cur.execute(
+                    "UPDATE videos SET views_count = views_count + 1 WHERE id = %s RETURNING views_count, viewers_hll",
+                    (video_id,)
+                )
+                views_count, viewers_hll = cur.fetchone()
+                if fingerprint:
+                    update_viewer_sketches(cur, video_id, viewers_hll, fingerprint)
+            else:
+                cur.execute("SELECT views_count FROM videos WHERE id = %s", (video_id,))
+                views_count = cur.fetchone()[0]
+            
+            purge_view_dedup(cur)
             conn.commit()
             
-            result = {'success': True, 'views_count': views_count}
+            if fingerprint:
+                view_dedup.remember((fingerprint, str(video_id)), views_count, durable_hit=not counted)
+            
+            result = {'success': True, 'views_count': views_count, 'counted': counted}
             
             cur.close()
             conn.close()
@@ -247,6 +525,59 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
+        elif action == 'unique_viewers':
+            video_id = params.get('video_id')
+            
+            if not video_id:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'video_id is required'}),
+                    'isBase64Encoded': False
+                }
+            
+            try:
+                video_id = int(video_id)
+                date_from = date.fromisoformat(params['from']) if params.get('from') else date.min
+                date_to = date.fromisoformat(params['to']) if params.get('to') else date.max
+            except ValueError:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid video_id or date range'}),
+                    'isBase64Encoded': False
+                }
+            
+            cur.execute(
+                "SELECT sketch FROM video_viewers_daily WHERE video_id = %s AND day BETWEEN %s AND %s",
+                (video_id, date_from, date_to)
+            )
+            sketch = hll.empty()
+            days = 0
+            for row in cur:
+                hll.merge(sketch, hll.load(row[0]))
+                days += 1
+            
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'video_id': video_id,
+                    'unique_viewers': hll.estimate(sketch),
+                    'from': params.get('from'),
+                    'to': params.get('to'),
+                    'days': days
+                }),
+                'isBase64Encoded': False
+            }
+        
         elif action == 'check_subscription':
             subscriber_id = params.get('subscriber_id')
             channel_id = params.get('channel_id')
@@ -1,9 +1,147 @@
 import json
 import os
 import psycopg2
-import boto3
 import base64
-from datetime import datetime
+import hashlib
+import secrets
+import time
+
+SHORTS_SESSION_SIZE = 500
+SHORTS_SESSION_TTL = 86400
+SHORTS_PAGE_SIZE = 5
+SHORTS_MAX_PAGE_SIZE = 20
+SHORTS_PREFETCH = 3
+
+_last_session_cleanup = 0.0
+_s3_client = None
+
+
+def decode_and_hash(video_base64: str):
+    """Декодирует видео и считает sha256 содержимого без лишних копий байтов"""
+    video_data = base64.b64decode(video_base64)
+    return hashlib.sha256(video_data).hexdigest(), video_data
+
+
+def get_s3_client():
+    """S3-клиент переиспользуется между вызовами в тёплом экземпляре.
+
+    boto3 импортируется здесь, а не на уровне модуля: он нужен только для
+    загрузки, а его импорт заметно удлиняет холодный старт чтения ленты.
+    """
+    global _s3_client
+    if _s3_client is None:
+        import boto3
+        _s3_client = boto3.client('s3',
+            endpoint_url='https://bucket.poehali.dev',
+            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+        )
+    return _s3_client
+
+
+def create_shorts_session(cur, user_id) -> str:
+    """Строит ранжированный список шортсов для сессии и сохраняет его массивом id.
+
+    Кандидаты берутся из свежих шортсов, ранжируются по популярности с
+    затуханием по возрасту; уже просмотренные пользователем уходят в конец.
+    """
+    cur.execute("""
+        SELECT array_agg(c.id ORDER BY c.seen, c.score DESC)
+        FROM (
+            SELECT v.id,
+                   (%s IS NOT NULL AND EXISTS (
+                       SELECT 1 FROM views w WHERE w.video_id = v.id AND w.user_id = %s
+                   )) AS seen,
+                   LN(2 + v.views_count + 5 * v.likes_count)
+                       / POWER(2 + EXTRACT(EPOCH FROM NOW() - v.created_at) / 3600.0, 1.2) AS score
+            FROM videos v
+            WHERE v.is_short = true
+            ORDER BY v.created_at DESC
+            LIMIT %s
+        ) c
+    """, (user_id, user_id, SHORTS_SESSION_SIZE * 4))
+    candidates = (cur.fetchone()[0] or [])[:SHORTS_SESSION_SIZE]
+    
+    session_id = secrets.token_hex(16)
+    cur.execute(
+        "INSERT INTO shorts_sessions (id, user_id, video_ids) VALUES (%s, %s, %s)",
+        (session_id, user_id, candidates)
+    )
+    
+    global _last_session_cleanup
+    if time.time() - _last_session_cleanup > SHORTS_SESSION_TTL / 24:
+        _last_session_cleanup = time.time()
+        cur.execute(
+            "DELETE FROM shorts_sessions WHERE created_at < NOW() - make_interval(secs => %s)",
+            (SHORTS_SESSION_TTL,)
+        )
+    return session_id
+
+
+def load_shorts_page(cur, session_id: str, cursor: int, limit: int):
+    """Страница сессии: срез массива id и следующие SHORTS_PREFETCH ссылок одним запросом.
+
+    Возвращает None, если сессия не найдена или истекла.
+    """
+    cur.execute("""
+        SELECT p.pos, array_length(s.video_ids, 1),
+               v.id, v.title, v.video_url, v.thumbnail_url,
+               v.duration, v.views_count, v.likes_count, v.created_at,
+               u.id, u.username, u.display_name, u.avatar_url
+        FROM shorts_sessions s
+        CROSS JOIN LATERAL unnest(s.video_ids[%s:%s]) WITH ORDINALITY AS p(video_id, pos)
+        JOIN videos v ON v.id = p.video_id
+        JOIN users u ON v.user_id = u.id
+        WHERE s.id = %s AND s.created_at > NOW() - make_interval(secs => %s)
+        ORDER BY p.pos
+    """, (cursor + 1, cursor + limit + SHORTS_PREFETCH, session_id, SHORTS_SESSION_TTL))
+    rows = cur.fetchall()
+    
+    if rows:
+        total = rows[0][1]
+    else:
+        cur.execute(
+            "SELECT array_length(video_ids, 1) FROM shorts_sessions WHERE id = %s AND created_at > NOW() - make_interval(secs => %s)",
+            (session_id, SHORTS_SESSION_TTL)
+        )
+        found = cur.fetchone()
+        if not found:
+            return None
+        total = found[0] or 0
+    
+    videos = []
+    prefetch = []
+    for row in rows:
+        if row[0] > limit:
+            prefetch.append(row[4])
+            continue
+        videos.append({
+            'id': row[2],
+            'title': row[3],
+            'video_url': row[4],
+            'thumbnail_url': row[5],
+            'duration': row[6],
+            'is_short': True,
+            'views_count': row[7],
+            'likes_count': row[8],
+            'created_at': row[9].isoformat(),
+            'user': {
+                'id': row[10],
+                'username': row[11],
+                'display_name': row[12],
+                'avatar_url': row[13]
+            }
+        })
+    
+    next_cursor = cursor + limit if cursor + limit < total else None
+    return {
+        'session_id': session_id,
+        'videos': videos,
+        'prefetch': prefetch,
+        'next_cursor': next_cursor,
+        'total': total
+    }
+
 
 def handler(event: dict, context) -> dict:
     """API для работы с видео: получение списка, загрузка, просмотр"""
@@ -30,6 +168,7 @@ def handler(event: dict, context) -> dict:
             video_id = params.get('id')
             user_id = params.get('user_id')
             is_short = params.get('is_short')
+            shorts_session = params.get('shorts_session')
             
             conn = psycopg2.connect(dsn)
             cur = conn.cursor()
@@ -38,7 +177,7 @@ def handler(event: dict, context) -> dict:
                 cur.execute("""
                     SELECT v.id, v.title, v.description, v.video_url, v.thumbnail_url, 
                            v.duration, v.is_short, v.views_count, v.likes_count, v.created_at,
-                           u.id, u.username, u.display_name, u.avatar_url
+                           v.unique_viewers, u.id, u.username, u.display_name, u.avatar_url
                     FROM videos v
                     JOIN users u ON v.user_id = u.id
                     WHERE v.id = %s
@@ -55,6 +194,37 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
+                cur.execute("""
+                    SELECT v.id, v.title, v.video_url, v.thumbnail_url,
+                           v.duration, v.is_short, v.views_count, v.created_at,
+                           u.id, u.username, u.display_name, u.avatar_url
+                    FROM video_related r
+                    CROSS JOIN LATERAL unnest(r.related_ids) WITH ORDINALITY AS p(video_id, pos)
+                    JOIN videos v ON v.id = p.video_id
+                    JOIN users u ON v.user_id = u.id
+                    WHERE r.video_id = %s
+                    ORDER BY p.pos
+                """, (video_id,))
+                
+                related = []
+                for item in cur.fetchall():
+                    related.append({
+                        'id': item[0],
+                        'title': item[1],
+                        'video_url': item[2],
+                        'thumbnail_url': item[3],
+                        'duration': item[4],
+                        'is_short': item[5],
+                        'views_count': item[6],
+                        'created_at': item[7].isoformat(),
+                        'user': {
+                            'id': item[8],
+                            'username': item[9],
+                            'display_name': item[10],
+                            'avatar_url': item[11]
+                        }
+                    })
+                
                 result = {
                     'id': video[0],
                     'title': video[1],
@@ -66,12 +236,14 @@ def handler(event: dict, context) -> dict:
                     'views_count': video[7],
                     'likes_count': video[8],
                     'created_at': video[9].isoformat(),
+                    'unique_viewers': video[10],
                     'user': {
-                        'id': video[10],
-                        'username': video[11],
-                        'display_name': video[12],
-                        'avatar_url': video[13]
-                    }
+                        'id': video[11],
+                        'username': video[12],
+                        'display_name': video[13],
+                        'avatar_url': video[14]
+                    },
+                    'related': related
                 }
                 
                 cur.close()
@@ -83,6 +255,39 @@ def handler(event: dict, context) -> dict:
                     'body': json.dumps(result),
                     'isBase64Encoded': False
                 }
+            elif shorts_session:
+                try:
+                    cursor = max(int(params.get('cursor', 0)), 0)
+                    limit = min(max(int(params.get('limit', SHORTS_PAGE_SIZE)), 1), SHORTS_MAX_PAGE_SIZE)
+                except ValueError:
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid cursor or limit'}),
+                        'isBase64Encoded': False
+                    }
+                
+                page = load_shorts_page(cur, shorts_session, cursor, limit)
+                
+                cur.close()
+                conn.close()
+                
+                if page is None:
+                    return {
+                        'statusCode': 404,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Shorts session not found or expired'}),
+                        'isBase64Encoded': False
+                    }
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(page),
+                    'isBase64Encoded': False
+                }
             else:
                 query = """
                     SELECT v.id, v.title, v.video_url, v.thumbnail_url, 
@@ -153,34 +358,43 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                video_data = base64.b64decode(video_base64)
+                content_hash, video_data = decode_and_hash(video_base64)
+                
+                conn = psycopg2.connect(dsn)
+                cur = conn.cursor()
                 
-                s3 = boto3.client('s3',
-                    endpoint_url='https://bucket.poehali.dev',
-                    aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-                    aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+                cur.execute(
+                    "SELECT object_key, ref_count FROM media_objects WHERE sha256 = %s FOR UPDATE",
+                    (content_hash,)
                 )
+                existing = cur.fetchone()
                 
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                video_key = f'videos/{user_id}_{timestamp}.mp4'
+                if existing:
+                    video_key = existing[0]
+                else:
+                    video_key = f'videos/sha256/{content_hash[:2]}/{content_hash}.mp4'
                 
-                s3.put_object(
-                    Bucket='files',
-                    Key=video_key,
-                    Body=video_data,
-                    ContentType='video/mp4'
-                )
+                # Объект без ссылок мог быть уже удалён прерванной сборкой мусора — кладём заново
+                if not existing or existing[1] == 0:
+                    get_s3_client().put_object(
+                        Bucket='files',
+                        Key=video_key,
+                        Body=video_data,
+                        ContentType='video/mp4'
+                    )
+                    cur.execute("""
+                        INSERT INTO media_objects (sha256, object_key, size_bytes)
+                        VALUES (%s, %s, %s)
+                        ON CONFLICT (sha256) DO NOTHING
+                    """, (content_hash, video_key, len(video_data)))
                 
                 video_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{video_key}"
                 
-                conn = psycopg2.connect(dsn)
-                cur = conn.cursor()
-                
                 cur.execute("""
-                    INSERT INTO videos (user_id, title, description, video_url, duration, is_short)
-                    VALUES (%s, %s, %s, %s, %s, %s)
+                    INSERT INTO videos (user_id, title, description, video_url, duration, is_short, content_hash)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
                     RETURNING id, created_at
-                """, (user_id, title, description, video_url, duration, is_short))
+                """, (user_id, title, description, video_url, duration, is_short, content_hash))
                 
                 video = cur.fetchone()
                 conn.commit()
@@ -189,6 +403,8 @@ def handler(event: dict, context) -> dict:
                     'success': True,
                     'video_id': video[0],
                     'video_url': video_url,
+                    'content_hash': content_hash,
+                    'deduplicated': bool(existing and existing[1] > 0),
                     'created_at': video[1].isoformat()
                 }
                 
@@ -202,6 +418,36 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
             
+            elif action == 'shorts_session':
+                user_id = body.get('user_id')
+                try:
+                    limit = min(max(int(body.get('limit', SHORTS_PAGE_SIZE)), 1), SHORTS_MAX_PAGE_SIZE)
+                except (TypeError, ValueError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid limit'}),
+                        'isBase64Encoded': False
+                    }
+                
+                conn = psycopg2.connect(dsn)
+                cur = conn.cursor()
+                
+                session_id = create_shorts_session(cur, user_id)
+                conn.commit()
+                
+                page = load_shorts_page(cur, session_id, 0, limit)
+                
+                cur.close()
+                conn.close()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(page),
+                    'isBase64Encoded': False
+                }
+            
             else:
                 return {
                     'statusCode': 400,
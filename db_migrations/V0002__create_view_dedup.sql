@@ -0,0 +1,15 @@
+-- Окно дедупликации просмотров: повторные просмотры не увеличивают счётчик
+
+-- Последний засчитанный просмотр для пары (зритель, видео)
+CREATE TABLE IF NOT EXISTS view_dedup (
+    fingerprint VARCHAR(64) NOT NULL,
+    video_id INTEGER NOT NULL REFERENCES videos(id),
+    seen_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (fingerprint, video_id)
+);
+
+-- Отпечаток зрителя в журнале просмотров (u:<id> или хэш для анонимов)
+ALTER TABLE views ADD COLUMN IF NOT EXISTS fingerprint VARCHAR(64);
+
+-- Индексы для очистки устаревших записей
+CREATE INDEX IF NOT EXISTS idx_view_dedup_seen_at ON view_dedup(seen_at);
@@ -0,0 +1,12 @@
+-- HyperLogLog-скетчи уникальных зрителей (4 КБ на видео и на видео-день)
+
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS viewers_hll BYTEA;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS unique_viewers INTEGER DEFAULT 0;
+
+-- Дневные скетчи для объединения по произвольному диапазону дат
+CREATE TABLE IF NOT EXISTS video_viewers_daily (
+    video_id INTEGER NOT NULL REFERENCES videos(id),
+    day DATE NOT NULL,
+    sketch BYTEA,
+    PRIMARY KEY (video_id, day)
+);
@@ -0,0 +1,13 @@
+-- Сессии ленты Shorts: заранее ранжированный список id для постраничной выдачи
+
+CREATE TABLE IF NOT EXISTS shorts_sessions (
+    id VARCHAR(32) PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id),
+    video_ids INTEGER[] NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Индексы для построения сессий и очистки устаревших
+CREATE INDEX IF NOT EXISTS idx_shorts_sessions_created_at ON shorts_sessions(created_at);
+CREATE INDEX IF NOT EXISTS idx_videos_shorts_created_at ON videos(created_at DESC) WHERE is_short = true;
+CREATE INDEX IF NOT EXISTS idx_views_user_video ON views(user_id, video_id);
@@ -0,0 +1,8 @@
+-- Ответы на комментарии и счётчики ответов
+
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS parent_id INTEGER REFERENCES comments(id);
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS reply_count INTEGER DEFAULT 0;
+
+-- Индексы для постраничной выдачи верхнего уровня и веток ответов
+CREATE INDEX IF NOT EXISTS idx_comments_video_top_level ON comments(video_id, created_at DESC, id DESC) WHERE parent_id IS NULL;
+CREATE INDEX IF NOT EXISTS idx_comments_parent ON comments(parent_id, created_at, id) WHERE parent_id IS NOT NULL;
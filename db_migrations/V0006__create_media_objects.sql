@@ -0,0 +1,35 @@
+-- Контентно-адресуемое хранение загруженных видео с подсчётом ссылок
+
+CREATE TABLE IF NOT EXISTS media_objects (
+    sha256 CHAR(64) PRIMARY KEY,
+    object_key VARCHAR(500) NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+
+-- Счётчик ссылок поддерживается триггером при любой вставке/удалении видео
+CREATE OR REPLACE FUNCTION media_objects_refcount() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.content_hash IS NOT NULL THEN
+        UPDATE media_objects SET ref_count = ref_count - 1, updated_at = NOW()
+        WHERE sha256 = OLD.content_hash;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.content_hash IS NOT NULL THEN
+        UPDATE media_objects SET ref_count = ref_count + 1, updated_at = NOW()
+        WHERE sha256 = NEW.content_hash;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_videos_media_refcount ON videos;
+CREATE TRIGGER trg_videos_media_refcount
+    AFTER INSERT OR DELETE OR UPDATE OF content_hash ON videos
+    FOR EACH ROW EXECUTE FUNCTION media_objects_refcount();
+
+-- Индекс для сборщика мусора
+CREATE INDEX IF NOT EXISTS idx_media_objects_unreferenced ON media_objects(updated_at) WHERE ref_count = 0;
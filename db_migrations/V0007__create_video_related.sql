@@ -0,0 +1,24 @@
+-- Похожие видео по совместным просмотрам (заполняется tools/build_related.py)
+
+CREATE TABLE IF NOT EXISTS video_related (
+    video_id INTEGER PRIMARY KEY REFERENCES videos(id),
+    related_ids INTEGER[] NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Водяные знаки пакетных задач
+CREATE TABLE IF NOT EXISTS related_job_state (
+    job VARCHAR(50) PRIMARY KEY,
+    last_viewed_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Отпечаток для просмотров, записанных до появления дедупликации
+UPDATE views SET fingerprint = 'u:' || user_id WHERE fingerprint IS NULL AND user_id IS NOT NULL;
+
+-- Индексы для выборки сессий зрителей
+CREATE INDEX IF NOT EXISTS idx_views_fingerprint_viewed_at ON views(fingerprint, viewed_at);
+CREATE INDEX IF NOT EXISTS idx_views_video_fingerprint ON views(video_id, fingerprint);
+
+-- Индекс для выборки новых просмотров по времени
+CREATE INDEX IF NOT EXISTS idx_views_viewed_at ON views(viewed_at);
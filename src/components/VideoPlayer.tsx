@@ -50,6 +50,8 @@ const VideoPlayer = ({ video, onClose, onUpdate }: VideoPlayerProps) => {
   const [subscribed, setSubscribed] = useState(false);
   const [likesCount, setLikesCount] = useState(0);
   const [comments, setComments] = useState<Comment[]>([]);
+  const [commentsTotal, setCommentsTotal] = useState(0);
+  const [commentsCursor, setCommentsCursor] = useState<string | null>(null);
   const [newComment, setNewComment] = useState('');
   const [loading, setLoading] = useState(false);
 
@@ -98,16 +100,25 @@ const VideoPlayer = ({ video, onClose, onUpdate }: VideoPlayerProps) => {
     }
   };
 
-  const loadComments = async () => {
+  const loadComments = async (cursor?: string) => {
     try {
       const params = new URLSearchParams({
         action: 'comment',
         video_id: video.id.toString()
       });
+      if (cursor) {
+        params.set('cursor', cursor);
+      }
       
       const response = await fetch(`https://functions.poehali.dev/84855cd8-6074-46c9-af9f-613a6511fa27?${params}`);
       const data = await response.json();
-      setComments(data.comments || []);
+      if (cursor) {
+        setComments((prev) => [...prev, ...(data.comments || [])]);
+      } else {
+        setComments(data.comments || []);
+        setCommentsTotal(data.total_count ?? (data.comments || []).length);
+      }
+      setCommentsCursor(data.next_cursor || null);
     } catch (error) {
       console.error('Failed to load comments:', error);
     }
@@ -309,7 +320,7 @@ const VideoPlayer = ({ video, onClose, onUpdate }: VideoPlayerProps) => {
 
             <ScrollArea className="flex-1 p-4">
               <div className="space-y-4">
-                <h3 className="font-semibold">{comments.length} комментариев</h3>
+                <h3 className="font-semibold">{commentsTotal} комментариев</h3>
                 
                 {comments.map((comment) => (
                   <div key={comment.id} className="flex gap-3">
@@ -329,6 +340,12 @@ const VideoPlayer = ({ video, onClose, onUpdate }: VideoPlayerProps) => {
                     </div>
                   </div>
                 ))}
+
+                {commentsCursor && (
+                  <Button variant="ghost" size="sm" onClick={() => loadComments(commentsCursor)}>
+                    Показать ещё
+                  </Button>
+                )}
               </div>
             </ScrollArea>
 
@@ -0,0 +1,139 @@
+"""Построение списков похожих видео по совместным просмотрам.
+
+Запуск: DATABASE_URL=... python tools/build_related.py [--top-k 20] [--full]
+
+Сессия — просмотры одного зрителя с паузами не длиннее SESSION_GAP. Видео,
+встретившиеся в одной сессии, считаются совместно просмотренными. Задача
+инкрементальная: пересчитываются только видео, у которых появились просмотры
+после прошлого запуска. Водяной знак — время просмотра с отставанием
+SAFETY_LAG от текущего времени, чтобы не пропустить транзакции, закоммиченные позже
+чтения водяного знака.
+
+Память ограничена: затронутые видео обрабатываются пачками, просмотры
+читаются серверным курсором, сессия хранит не больше MAX_SESSION_VIDEOS
+последних видео, а счётчики каждого видео периодически обрезаются до самых
+частых кандидатов.
+
+Стоимость: для каждой пачки читается история всех зрителей этих видео, поэтому
+она ограничена горизонтом истории (--history-days, по умолчанию 90 дней);
+совместные просмотры старше горизонта в пересчёте не участвуют.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter, deque
+from datetime import timedelta
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+JOB_NAME = 'related_videos'
+SESSION_GAP = timedelta(minutes=30)
+SAFETY_LAG = timedelta(minutes=5)
+MAX_SESSION_VIDEOS = 200
+VIDEO_BATCH = 1000
+PRUNE_FACTOR = 20
+
+
+def add_session(counts: dict, session, top_k: int):
+    videos = set(session)
+    for video_id in videos:
+        counter = counts.get(video_id)
+        if counter is None:
+            continue
+        for other in videos:
+            if other != video_id:
+                counter[other] += 1
+        if len(counter) > top_k * PRUNE_FACTOR:
+            counts[video_id] = Counter(dict(counter.most_common(top_k * PRUNE_FACTOR // 2)))
+
+
+def build_batch(dsn: str, batch: list, since, watermark, top_k: int) -> dict:
+    """Счётчики совместных просмотров для пачки видео по всем сессиям их зрителей"""
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor(name='related_sessions')
+    cur.itersize = 10000
+    cur.execute("""
+        SELECT fingerprint, video_id, viewed_at
+        FROM views
+        WHERE viewed_at > %s AND viewed_at <= %s
+          AND fingerprint IN (
+              SELECT DISTINCT fingerprint FROM views
+              WHERE video_id = ANY(%s) AND fingerprint IS NOT NULL
+                AND viewed_at > %s AND viewed_at <= %s
+          )
+        ORDER BY fingerprint, viewed_at
+    """, (since, watermark, batch, since, watermark))
+
+    counts = {video_id: Counter() for video_id in batch}
+    viewer = last_seen = None
+    session = deque(maxlen=MAX_SESSION_VIDEOS)
+    for fingerprint, video_id, viewed_at in cur:
+        if fingerprint != viewer or viewed_at - last_seen > SESSION_GAP:
+            add_session(counts, session, top_k)
+            viewer = fingerprint
+            session = deque(maxlen=MAX_SESSION_VIDEOS)
+        session.append(video_id)
+        last_seen = viewed_at
+    add_session(counts, session, top_k)
+
+    cur.close()
+    conn.close()
+    return counts
+
+
+def run(dsn: str, top_k: int, full: bool, history: timedelta):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+
+    cur.execute("SELECT LOCALTIMESTAMP - %s", (SAFETY_LAG,))
+    watermark = cur.fetchone()[0]
+    since = watermark - history
+
+    cur.execute("SELECT last_viewed_at FROM related_job_state WHERE job = %s", (JOB_NAME,))
+    row = cur.fetchone()
+    previous = since if full or not row or row[0] is None else max(row[0], since)
+
+    cur.execute(
+        "SELECT DISTINCT video_id FROM views WHERE viewed_at > %s AND viewed_at <= %s ORDER BY video_id",
+        (previous, watermark)
+    )
+    affected = [r[0] for r in cur.fetchall()]
+    print(f'{len(affected)} videos with new views since {previous:%Y-%m-%d %H:%M:%S}', file=sys.stderr)
+
+    started = time.perf_counter()
+    for start in range(0, len(affected), VIDEO_BATCH):
+        batch = affected[start:start + VIDEO_BATCH]
+        counts = build_batch(dsn, batch, since, watermark, top_k)
+        rows = [
+            (video_id, [other for other, _ in counter.most_common(top_k)])
+            for video_id, counter in counts.items()
+        ]
+        execute_values(cur, """
+            INSERT INTO video_related (video_id, related_ids) VALUES %s
+            ON CONFLICT (video_id) DO UPDATE SET related_ids = EXCLUDED.related_ids, updated_at = NOW()
+        """, rows)
+        conn.commit()
+        print(f'{start + len(batch)}/{len(affected)} videos, {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+    cur.execute("""
+        INSERT INTO related_job_state (job, last_viewed_at) VALUES (%s, %s)
+        ON CONFLICT (job) DO UPDATE SET last_viewed_at = EXCLUDED.last_viewed_at, updated_at = NOW()
+    """, (JOB_NAME, watermark))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--full', action='store_true', help='пересчитать все видео, игнорируя водяной знак')
+    parser.add_argument('--history-days', type=int, default=90, help='горизонт истории зрителей')
+    args = parser.parse_args()
+    run(os.environ['DATABASE_URL'], args.top_k, args.full, timedelta(days=args.history_days))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""Массовый импорт и экспорт таблиц через COPY FROM STDIN / COPY TO STDOUT.
+
+Запуск:
+    DATABASE_URL=... python tools/bulk.py import users users.csv
+    DATABASE_URL=... python tools/bulk.py import views views.ndjson
+    DATABASE_URL=... python tools/bulk.py export videos - --format ndjson > videos.ndjson
+    DATABASE_URL=... python tools/bulk.py recompute
+
+Данные идут потоком порциями, поэтому память не зависит от объёма файла.
+При импорте вторичные индексы таблицы удаляются и строятся заново после
+загрузки (в той же транзакции), затем счётчики, зависящие от импортированной
+таблицы (views_count, likes_count, reply_count), пересчитываются одним UPDATE
+на каждый. После импорта views и likes пересчитываются только видео, строки
+которых есть в файле.
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import time
+
+import psycopg2
+
+TABLES = {
+    'users': ['id', 'username', 'email', 'password_hash', 'display_name', 'channel_description',
+              'avatar_url', 'created_at'],
+    'videos': ['id', 'user_id', 'title', 'description', 'video_url', 'thumbnail_url', 'duration',
+               'is_short', 'views_count', 'likes_count', 'content_hash', 'created_at'],
+    'comments': ['id', 'video_id', 'user_id', 'parent_id', 'content', 'reply_count', 'created_at'],
+    'likes': ['id', 'video_id', 'user_id', 'created_at'],
+    'subscriptions': ['id', 'subscriber_id', 'channel_id', 'created_at'],
+    'views': ['id', 'video_id', 'user_id', 'fingerprint', 'viewed_at'],
+    'media_objects': ['sha256', 'object_key', 'size_bytes', 'ref_count', 'created_at', 'updated_at'],
+}
+
+COUNTERS = {
+    'views_count': "UPDATE videos v SET views_count = c.n FROM ("
+                   " SELECT v2.id, COUNT(w.id) AS n FROM videos v2 LEFT JOIN views w ON w.video_id = v2.id"
+                   " {where} GROUP BY v2.id) c WHERE c.id = v.id AND v.views_count IS DISTINCT FROM c.n",
+    'likes_count': "UPDATE videos v SET likes_count = c.n FROM ("
+                   " SELECT v2.id, COUNT(l.id) AS n FROM videos v2 LEFT JOIN likes l ON l.video_id = v2.id"
+                   " {where} GROUP BY v2.id) c WHERE c.id = v.id AND v.likes_count IS DISTINCT FROM c.n",
+    'reply_count': "UPDATE comments p SET reply_count = c.n FROM ("
+                   " SELECT p2.id, COUNT(r.id) AS n FROM comments p2 LEFT JOIN comments r ON r.parent_id = p2.id"
+                   " GROUP BY p2.id) c WHERE c.id = p.id AND p.reply_count IS DISTINCT FROM c.n",
+    'ref_count': "UPDATE media_objects m SET ref_count = c.n FROM ("
+                 " SELECT m2.sha256, COUNT(v.id) AS n FROM media_objects m2"
+                 " LEFT JOIN videos v ON v.content_hash = m2.sha256"
+                 " GROUP BY m2.sha256) c WHERE c.sha256 = m.sha256 AND m.ref_count IS DISTINCT FROM c.n",
+}
+
+# Импорт videos не трогает views_count/likes_count: при миграции они приходят
+# вместе с видео, а сырых views/likes может не быть вовсе (для этого есть
+# команда recompute). ref_count пересчитывается, чтобы триггер не посчитал
+# ссылки дважды поверх импортированных значений.
+# Импорт views/likes часто частичный: у видео без сырых строк полный пересчёт
+# обнулил бы счётчик, поэтому он ограничен видео из импорта (IMPORTED_VIDEOS).
+COUNTERS_BY_TABLE = {
+    'videos': ['ref_count'],
+    'views': ['views_count'],
+    'likes': ['likes_count'],
+    'comments': ['reply_count'],
+    'media_objects': ['ref_count'],
+}
+
+# Строки, записанные COPY в текущей транзакции, несут её xid в xmin
+IMPORTED_VIDEOS = ("WHERE v2.id IN (SELECT video_id FROM {table}"
+                   " WHERE xmin::text::bigint = txid_current() % 4294967296)")
+
+CHUNK_SIZE = 1 << 16
+
+
+class Progress:
+    def __init__(self, label: str):
+        self.label = label
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.reported = self.started
+
+    def add(self, rows: int):
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self.reported >= 2:
+            self.reported = now
+            self.report()
+
+    def report(self, final: bool = False):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        suffix = ' done' if final else ''
+        print(f'{self.label}: {self.rows} rows, {self.rows / elapsed:.0f} rows/s, {elapsed:.1f}s{suffix}',
+              file=sys.stderr)
+
+
+class CopyReader:
+    """Файлоподобный источник для COPY FROM: склеивает строки CSV в порции по запросу read()"""
+
+    def __init__(self, lines, progress: Progress):
+        self.lines = iter(lines)
+        self.progress = progress
+        self.buffer = b''
+
+    def read(self, size: int = -1) -> bytes:
+        size = CHUNK_SIZE if size is None or size < 0 else size
+        parts = [self.buffer]
+        length = len(self.buffer)
+        rows = 0
+        for line in self.lines:
+            parts.append(line)
+            length += len(line)
+            rows += 1
+            if length >= size:
+                break
+        self.progress.add(rows)
+        data = b''.join(parts)
+        self.buffer = data[size:]
+        return data[:size]
+
+
+class CopyWriter:
+    """Приёмник для COPY TO: пишет в файл построчно и считает строки"""
+
+    def __init__(self, out, progress: Progress, unescape_text: bool = False):
+        self.out = out
+        self.progress = progress
+        self.unescape_text = unescape_text
+        self.tail = b''
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        data = self.tail + data
+        end = data.rfind(b'\n') + 1
+        self.tail = data[end:]
+        complete = data[:end]
+        if self.unescape_text:
+            # Текстовый формат COPY удваивает обратные слэши внутри JSON
+            complete = complete.replace(b'\\\\', b'\\')
+        self.out.write(complete)
+        self.progress.add(complete.count(b'\n'))
+
+
+def csv_value(value) -> str:
+    """Значение для COPY в CSV: всё, кроме NULL, в кавычках, поэтому строка "\\N" остаётся строкой"""
+    if value is None:
+        return r'\N'
+    if isinstance(value, bool):
+        value = 'true' if value else 'false'
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def ndjson_groups(source, table: str):
+    """Записи NDJSON, сгруппированные подряд по набору ключей.
+
+    Каждая группа загружается своим COPY со своим списком колонок, поэтому
+    отсутствующие в записи колонки получают DEFAULT, а не NULL. Неизвестные
+    ключи — ошибка, а не молчаливый пропуск.
+    """
+    known = TABLES[table]
+
+    def records():
+        for number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            unknown = set(record) - set(known)
+            if unknown:
+                raise SystemExit(f'line {number}: unknown columns for {table}: {", ".join(sorted(unknown))}')
+            yield tuple(c for c in known if c in record), record
+
+    for columns, group in itertools.groupby(records(), key=lambda item: item[0]):
+        lines = (
+            (','.join(csv_value(record[c]) for c in columns) + '\n').encode('utf-8')
+            for _, record in group
+        )
+        yield list(columns), lines
+
+
+def open_input(path: str):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    return open(path, encoding='utf-8', newline='')
+
+
+def detect_format(path: str, fmt: str) -> str:
+    if fmt:
+        return fmt
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def secondary_indexes(cur, table: str) -> list:
+    """Индексы таблицы, не обслуживающие PRIMARY KEY / UNIQUE ограничения"""
+    cur.execute("""
+        SELECT i.relname, pg_get_indexdef(x.indexrelid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+    """, (table,))
+    return cur.fetchall()
+
+
+def recompute(cur, counters: list, where: str = ''):
+    for name in counters:
+        started = time.perf_counter()
+        cur.execute(COUNTERS[name].format(where=where))
+        print(f'{name}: {cur.rowcount} rows updated in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+
+def import_table(conn, table: str, path: str, fmt: str, keep_indexes: bool, skip_counters: bool):
+    fmt = detect_format(path, fmt)
+    cur = conn.cursor()
+
+    indexes = [] if keep_indexes else secondary_indexes(cur, table)
+    for name, _ in indexes:
+        cur.execute(f'DROP INDEX {name}')
+
+    progress = Progress(f'import {table}')
+    with open_input(path) as f:
+        if fmt == 'csv':
+            header = next(csv.reader([f.readline()]))
+            unknown = set(header) - set(TABLES[table])
+            if unknown:
+                raise SystemExit(f'unknown columns for {table}: {", ".join(sorted(unknown))}')
+            groups = [(header, (line.encode('utf-8') for line in f))]
+            null = ''
+        else:
+            groups = ndjson_groups(f, table)
+            null = ", NULL '\\N'"
+        has_ids = False
+        for columns, lines in groups:
+            has_ids = has_ids or 'id' in columns
+            cur.copy_expert(
+                f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv{null})",
+                CopyReader(lines, progress),
+                size=CHUNK_SIZE
+            )
+    progress.report(final=True)
+
+    for name, definition in indexes:
+        started = time.perf_counter()
+        cur.execute(definition)
+        print(f'index {name} rebuilt in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+    if has_ids:
+        cur.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+        )
+
+    if table == 'videos':
+        # Без строки media_objects загрузка тех же байтов заведёт новый счётчик ссылок,
+        # не знающий об импортированных видео, и сборщик мусора удалит их объект
+        cur.execute("""
+            SELECT COUNT(DISTINCT v.content_hash) FROM videos v
+            WHERE v.content_hash IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM media_objects m WHERE m.sha256 = v.content_hash)
+        """)
+        missing = cur.fetchone()[0]
+        if missing:
+            conn.rollback()
+            raise SystemExit(f'{missing} content hashes have no media_objects row: import media_objects first')
+
+    if not skip_counters:
+        where = IMPORTED_VIDEOS.format(table=table) if table in ('views', 'likes') else ''
+        recompute(cur, COUNTERS_BY_TABLE.get(table, []), where)
+    conn.commit()
+    cur.close()
+
+    if table == 'views' and not skip_counters:
+        print('run tools/rebuild_viewer_sketches.py to refresh unique viewer counts', file=sys.stderr)
+
+
+def export_table(conn, table: str, path: str, fmt: str):
+    fmt = detect_format(path, fmt)
+    columns = ', '.join(TABLES[table])
+    key = TABLES[table][0]
+    if fmt == 'csv':
+        sql = f"COPY (SELECT {columns} FROM {table} ORDER BY {key}) TO STDOUT WITH (FORMAT csv, HEADER)"
+    else:
+        sql = f"COPY (SELECT row_to_json(t) FROM (SELECT {columns} FROM {table} ORDER BY {key}) t) TO STDOUT"
+
+    out = sys.stdout.buffer if path == '-' else open(path, 'wb')
+    progress = Progress(f'export {table}')
+    writer = CopyWriter(out, progress, unescape_text=(fmt == 'ndjson'))
+    cur = conn.cursor()
+    cur.copy_expert(sql, writer, size=CHUNK_SIZE)
+    cur.close()
+    out.flush()
+    if out is not sys.stdout.buffer:
+        out.close()
+    progress.report(final=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for name in ('import', 'export'):
+        command = commands.add_parser(name)
+        command.add_argument('table', choices=sorted(TABLES))
+        command.add_argument('path', help='файл или - для stdin/stdout')
+        command.add_argument('--format', choices=('csv', 'ndjson'), default=None)
+        if name == 'import':
+            command.add_argument('--keep-indexes', action='store_true', help='не перестраивать индексы')
+            command.add_argument('--skip-counters', action='store_true', help='не пересчитывать счётчики')
+
+    commands.add_parser('recompute', help='пересчитать все денормализованные счётчики')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    if args.command == 'import':
+        import_table(conn, args.table, args.path, args.format, args.keep_indexes, args.skip_counters)
+    elif args.command == 'export':
+        export_table(conn, args.table, args.path, args.format)
+    else:
+        cur = conn.cursor()
+        recompute(cur, list(COUNTERS))
+        conn.commit()
+        cur.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Сборка мусора в хранилище видео: удаление объектов без ссылок.
+
+Запуск: DATABASE_URL=... AWS_ACCESS_KEY_ID=... AWS_SECRET_ACCESS_KEY=... \\
+        python tools/gc_media_objects.py [--grace-hours 24] [--dry-run]
+
+Удаляются только объекты с ref_count = 0, к которым не обращались дольше
+grace-периода: это защищает загрузку, которая уже положила объект в S3, но
+ещё не вставила строку видео. Строки берутся по одной с FOR UPDATE SKIP LOCKED
+и удаляются в отдельной транзакции на каждый объект, поэтому загрузка,
+переиспользующая объект, и сборщик не пересекаются.
+"""
+import argparse
+import os
+import sys
+
+import boto3
+import psycopg2
+
+
+def collect(dsn: str, grace_hours: int, dry_run: bool):
+    s3 = boto3.client('s3',
+        endpoint_url='https://bucket.poehali.dev',
+        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+    )
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+
+    deleted = freed = 0
+    while True:
+        cur.execute("""
+            SELECT sha256, object_key, size_bytes FROM media_objects
+            WHERE ref_count = 0 AND updated_at < NOW() - make_interval(hours => %s)
+            ORDER BY updated_at
+            OFFSET %s
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """, (grace_hours, deleted if dry_run else 0))
+        row = cur.fetchone()
+        if not row:
+            break
+        sha256, object_key, size_bytes = row
+
+        print(f'{"would delete" if dry_run else "delete"} {object_key} ({size_bytes} bytes)', file=sys.stderr)
+        if dry_run:
+            conn.rollback()
+        else:
+            # Сначала строка, потом объект, коммит на каждый объект: при сбое S3 строка
+            # откатывается вместе с целым объектом, а если процесс упадёт после удаления
+            # объекта, загрузка увидит ref_count = 0 и положит байты заново
+            cur.execute("DELETE FROM media_objects WHERE sha256 = %s", (sha256,))
+            s3.delete_object(Bucket='files', Key=object_key)
+            conn.commit()
+        deleted += 1
+        freed += size_bytes
+
+    cur.close()
+    conn.close()
+    print(f'{deleted} objects, {freed / 1024 / 1024:.1f} MB {"reclaimable" if dry_run else "freed"}', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--grace-hours', type=int, default=24)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+    collect(os.environ['DATABASE_URL'], args.grace_hours, args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Сравнение HyperLogLog-скетча с точным подсчётом уникальных зрителей.
+
+Запуск: python tools/hll_bench.py [--sizes 1000,100000,1000000] [--dsn ...]
+
+Без --dsn сравнивает скетч с set() в памяти. С --dsn дополнительно замеряет
+точный COUNT(DISTINCT ...) по таблице views (с тем же ключом зрителя, что и
+пересборка скетчей) против чтения unique_viewers.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'interactions'))
+
+import hll
+
+
+def bench_memory(size: int):
+    distinct = max(size // 2, 1)
+    exact = set()
+    sketch = hll.empty()
+
+    started = time.perf_counter()
+    for i in range(size):
+        exact.add(f'u:{i % distinct}')
+    exact_add = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(size):
+        hll.add(sketch, f'u:{i % distinct}')
+    sketch_add = time.perf_counter() - started
+
+    started = time.perf_counter()
+    estimated = hll.estimate(sketch)
+    estimate_time = time.perf_counter() - started
+
+    error = abs(estimated - len(exact)) / len(exact) * 100
+    print(f'{size:>10} events  exact={len(exact):>9}  hll={estimated:>9}  error={error:5.2f}%  '
+          f'set={exact_add:6.2f}s  hll={sketch_add:6.2f}s  estimate={estimate_time * 1000:5.1f}ms  '
+          f'memory: set~{sys.getsizeof(exact) // 1024}KB hll={len(sketch) // 1024}KB')
+
+
+def bench_database(dsn: str):
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("SELECT video_id FROM views GROUP BY video_id ORDER BY COUNT(*) DESC LIMIT 5")
+    for (video_id,) in cur.fetchall():
+        started = time.perf_counter()
+        cur.execute(
+            "SELECT COUNT(DISTINCT COALESCE(fingerprint, 'u:' || user_id::text)) FROM views WHERE video_id = %s",
+            (video_id,)
+        )
+        exact = cur.fetchone()[0]
+        exact_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        cur.execute("SELECT unique_viewers FROM videos WHERE id = %s", (video_id,))
+        estimated = cur.fetchone()[0] or 0
+        sketch_time = time.perf_counter() - started
+
+        error = abs(estimated - exact) / exact * 100 if exact else 0.0
+        print(f'video {video_id:>8}  exact={exact:>9} ({exact_time * 1000:7.1f}ms)  '
+              f'hll={estimated:>9} ({sketch_time * 1000:5.1f}ms)  error={error:5.2f}%')
+    cur.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000,1000000')
+    parser.add_argument('--dsn', default=None)
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(',')):
+        bench_memory(size)
+    if args.dsn:
+        bench_database(args.dsn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Пересборка HyperLogLog-скетчей уникальных зрителей из таблицы views.
+
+Запуск: DATABASE_URL=... python tools/rebuild_viewer_sketches.py [--video-id N]
+
+Нужна после миграции (для старых просмотров) и после массового импорта.
+Просмотры читаются серверным курсором, упорядоченными по видео, поэтому
+в памяти держатся скетчи только одного видео.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'interactions'))
+
+import psycopg2
+import hll
+
+
+def flush(cur, video_id, total, daily):
+    cur.execute(
+        "UPDATE videos SET viewers_hll = %s, unique_viewers = %s WHERE id = %s",
+        (psycopg2.Binary(bytes(total)), hll.estimate(total), video_id)
+    )
+    for day, sketch in daily.items():
+        cur.execute("""
+            INSERT INTO video_viewers_daily (video_id, day, sketch)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (video_id, day) DO UPDATE SET sketch = EXCLUDED.sketch
+        """, (video_id, day, psycopg2.Binary(bytes(sketch))))
+
+
+def rebuild(dsn: str, video_id=None):
+    read_conn = psycopg2.connect(dsn)
+    write_conn = psycopg2.connect(dsn)
+    read_cur = read_conn.cursor(name='viewer_sketches')
+    read_cur.itersize = 10000
+    write_cur = write_conn.cursor()
+
+    query = """
+        SELECT video_id, viewed_at::date,
+               COALESCE(fingerprint, 'u:' || user_id::text)
+        FROM views
+        WHERE (fingerprint IS NOT NULL OR user_id IS NOT NULL)
+    """
+    params = []
+    if video_id:
+        query += " AND video_id = %s"
+        params.append(video_id)
+    query += " ORDER BY video_id"
+    read_cur.execute(query, params)
+
+    started = time.perf_counter()
+    current = None
+    total = daily = None
+    rows = videos = 0
+    for row_video, day, fingerprint in read_cur:
+        if row_video != current:
+            if current is not None:
+                flush(write_cur, current, total, daily)
+                write_conn.commit()
+                videos += 1
+            current = row_video
+            total = hll.empty()
+            daily = {}
+        hll.add(total, fingerprint)
+        hll.add(daily.setdefault(day, hll.empty()), fingerprint)
+        rows += 1
+        if rows % 100000 == 0:
+            print(f'{rows} views, {rows / (time.perf_counter() - started):.0f} rows/s', file=sys.stderr)
+    if current is not None:
+        flush(write_cur, current, total, daily)
+        write_conn.commit()
+        videos += 1
+
+    read_cur.close()
+    read_conn.close()
+    write_cur.close()
+    write_conn.close()
+    print(f'rebuilt {videos} videos from {rows} views in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--video-id', type=int, default=None)
+    args = parser.parse_args()
+    rebuild(os.environ['DATABASE_URL'], args.video_id)
+
+
+if __name__ == '__main__':
+    main()
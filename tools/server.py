@@ -0,0 +1,224 @@
+"""Самостоятельный HTTP-сервер: все четыре функции в одном процессе.
+
+Запуск:
+    DATABASE_URL=... python tools/server.py --port 8000 --workers 4 --threads 16
+    DATABASE_URL=... gunicorn -w 4 --threads 16 -b :8000 tools.server:app
+
+Путь /<функция> направляется в handler(event, context) из backend/<функция>/index.py
+через адаптер событий облачной функции. Внутри процесса все обработчики делят
+пул соединений с Postgres, кэшированный S3-клиент и кэши уровня модуля
+(например, окно дедупликации просмотров).
+"""
+import argparse
+import base64
+import http
+import importlib.util
+import json
+import os
+import signal
+import sys
+import threading
+import uuid
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+import psycopg2
+import psycopg2.pool
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+FUNCTIONS = ('auth', 'videos', 'profile', 'interactions')
+
+POOL_MIN = int(os.environ.get('POOL_MIN', '1'))
+POOL_MAX = int(os.environ.get('POOL_MAX', '20'))
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(POOL_MAX)
+
+
+def get_pool():
+    """Пул создаётся лениво, уже внутри рабочего процесса (после fork)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = psycopg2.pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, os.environ['DATABASE_URL'])
+    return _pool
+
+
+class PooledConnection:
+    """Соединение из пула; close() возвращает его в пул вместо закрытия"""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = pool.getconn()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if conn.closed:
+            self._pool.putconn(conn, close=True)
+            return
+        try:
+            conn.rollback()
+        except Exception:
+            # Полуоборванное соединение не возвращаем в оборот, но освобождаем слот пула
+            self._pool.putconn(conn, close=True)
+            return
+        self._pool.putconn(conn)
+
+    def __del__(self):
+        # Обработчики не закрывают соединение на пути исключения
+        self.close()
+
+
+class PooledPsycopg2:
+    """Подмена модуля psycopg2 в обработчиках: connect() берёт соединение из пула"""
+
+    def connect(self, *args, **kwargs):
+        return PooledConnection(get_pool())
+
+    def __getattr__(self, name):
+        return getattr(psycopg2, name)
+
+
+def load_handlers() -> dict:
+    handlers = {}
+    for name in FUNCTIONS:
+        function_dir = os.path.join(BACKEND_DIR, name)
+        if function_dir not in sys.path:
+            sys.path.insert(0, function_dir)
+        spec = importlib.util.spec_from_file_location(f'{name}_index', os.path.join(function_dir, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.psycopg2 = PooledPsycopg2()
+        handlers[name] = module.handler
+    return handlers
+
+
+class Context:
+    def __init__(self, function_name: str):
+        self.function_name = function_name
+        self.request_id = uuid.uuid4().hex
+
+
+def build_event(environ: dict) -> dict:
+    """WSGI environ -> событие облачной функции"""
+    headers = {}
+    for key, value in environ.items():
+        if key.startswith('HTTP_'):
+            headers[key[5:].replace('_', '-').title()] = value
+    if environ.get('CONTENT_TYPE'):
+        headers['Content-Type'] = environ['CONTENT_TYPE']
+
+    length = int(environ.get('CONTENT_LENGTH') or 0)
+    raw = environ['wsgi.input'].read(length) if length else b''
+    try:
+        body, is_base64 = raw.decode('utf-8'), False
+    except UnicodeDecodeError:
+        body, is_base64 = base64.b64encode(raw).decode('ascii'), True
+
+    return {
+        'httpMethod': environ['REQUEST_METHOD'],
+        'path': environ.get('PATH_INFO', '/'),
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(environ.get('QUERY_STRING', ''))),
+        'body': body or '{}',
+        'isBase64Encoded': is_base64,
+        'requestContext': {'identity': {'sourceIp': environ.get('REMOTE_ADDR', '')}}
+    }
+
+
+HANDLERS = load_handlers()
+
+
+def app(environ, start_response):
+    name = environ.get('PATH_INFO', '/').strip('/').split('/')[0]
+    handler = HANDLERS.get(name)
+    if handler is None:
+        start_response('404 Not Found', [('Content-Type', 'application/json')])
+        return [json.dumps({'error': 'Unknown function'}).encode()]
+
+    event = build_event(environ)
+    with _slots:
+        response = handler(event, Context(name))
+
+    body = response.get('body', '')
+    if response.get('isBase64Encoded'):
+        payload = base64.b64decode(body)
+    else:
+        payload = body.encode('utf-8')
+    status = response.get('statusCode', 200)
+    headers = [(k, str(v)) for k, v in (response.get('headers') or {}).items()]
+    headers.append(('Content-Length', str(len(payload))))
+    start_response(f'{status} {http.HTTPStatus(status).phrase}', headers)
+    return [payload]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str, port: int, workers: int, threads: int):
+    global POOL_MAX, _slots
+    POOL_MAX = max(POOL_MAX, threads)
+    _slots = threading.BoundedSemaphore(threads)
+
+    server = ThreadingWSGIServer((host, port), QuietHandler)
+    server.set_app(app)
+
+    children = []
+    for _ in range(workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            server.serve_forever()
+            os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    # Ставится после fork: дочерние процессы завершаются по SIGTERM как обычно
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f'serving {", ".join(FUNCTIONS)} on {host}:{port} with {workers} workers', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=16, help='одновременных запросов на процесс')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Сравнение пропускной способности: облачные функции против самостоятельного сервера.
+
+Запуск:
+    python tools/server_bench.py --target cloud
+    python tools/server_bench.py --target http://localhost:8000
+
+Для cloud адреса берутся из backend/func2url.json, для сервера — <url>/<функция>.
+Отправляет одинаковый набор read-запросов в --concurrency потоков и печатает
+запросы в секунду и перцентили задержки по каждой функции.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+FUNC2URL = os.path.join(os.path.dirname(__file__), '..', 'backend', 'func2url.json')
+
+REQUESTS = [
+    ('videos', {}),
+    ('videos', {'id': '1'}),
+    ('profile', {'user_id': '1'}),
+    ('interactions', {'action': 'comment', 'video_id': '1'}),
+]
+
+
+def resolve(target: str) -> dict:
+    if target == 'cloud':
+        with open(FUNC2URL) as f:
+            return json.load(f)
+    return {name: f'{target.rstrip("/")}/{name}' for name, _ in REQUESTS}
+
+
+def run(urls: dict, total: int, concurrency: int):
+    latencies = {name: [] for name, _ in REQUESTS}
+    errors = []
+    counter = iter(range(total))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            name, params = REQUESTS[i % len(REQUESTS)]
+            url = urls[name] + ('?' + urlencode(params) if params else '')
+            started = time.perf_counter()
+            try:
+                with urlopen(url, timeout=30) as response:
+                    response.read()
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            latencies[name].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    done = sum(len(v) for v in latencies.values())
+    print(f'{done} ok, {len(errors)} errors in {elapsed:.1f}s: {done / elapsed:.1f} req/s')
+    for name, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        p50 = values[len(values) // 2] * 1000
+        p95 = values[int(len(values) * 0.95)] * 1000
+        print(f'  {name:<14} n={len(values):<6} p50={p50:7.1f}ms  p95={p95:7.1f}ms')
+    if errors:
+        print(f'  first error: {errors[0]}', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', default='http://localhost:8000', help='cloud или базовый URL сервера')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+    run(resolve(args.target), args.requests, args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Профиль холодного старта функций: время импорта и первого запроса.
+
+Запуск:
+    python tools/startup_profile.py                 # все функции
+    python tools/startup_profile.py videos --top 10 # самые тяжёлые импорты
+    python tools/startup_profile.py --check         # код выхода 1 при превышении бюджета
+    DATABASE_URL=... python tools/startup_profile.py --db  # запросы к настоящей БД
+
+Каждая функция импортируется в отдельном чистом интерпретаторе, как при
+холодном старте, и выполняет все GET-запросы из своего tests.json (или голый
+GET, если их нет). По умолчанию psycopg2.connect подменяется пустой БД: запросы
+ничего не находят и ничего не пишут, но код обработчика выполняется целиком.
+
+Бюджеты в миллисекундах и модули, которые не должны загружаться при холодном
+старте (deferred_imports), лежат в tools/startup_budget.json; ответ 5xx на
+любой из запросов тоже считается провалом проверки.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
+FUNCTIONS = ('auth', 'videos', 'profile', 'interactions')
+
+PROBE = '''
+import importlib.util, json, os, sys, time
+path, events, stub_db = sys.argv[1], json.loads(sys.argv[2]), sys.argv[3] == 'stub'
+
+
+class StubCursor:
+    rowcount = 0
+
+    def __init__(self):
+        self.query = ''
+
+    def execute(self, query, params=None):
+        self.query = query
+
+    def fetchone(self):
+        return (0,) if 'COUNT(' in self.query.upper() else None
+
+    def fetchall(self):
+        return []
+
+    def __iter__(self):
+        return iter(())
+
+    def close(self):
+        pass
+
+
+class StubConnection:
+    def cursor(self, *args, **kwargs):
+        return StubCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class StubPsycopg2:
+    def __init__(self, real):
+        self._real = real
+
+    def connect(self, *args, **kwargs):
+        return StubConnection()
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+
+sys.path.insert(0, os.path.dirname(path))
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('index', path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+if stub_db:
+    module.psycopg2 = StubPsycopg2(module.psycopg2)
+statuses = []
+for event in events:
+    statuses.append(module.handler(event, None).get('statusCode'))
+    if len(statuses) == 1:
+        finished = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (finished - imported) * 1000,
+    'statuses': statuses,
+}))
+'''
+
+
+def probe_events(name: str) -> list:
+    """GET-запросы из tests.json; только GET, чтобы профилирование с --db ничего не писало"""
+    with open(os.path.join(BACKEND_DIR, name, 'tests.json')) as f:
+        tests = [t for t in json.load(f)['tests'] if t['method'] == 'GET']
+    if not tests:
+        return [{'httpMethod': 'GET', 'queryStringParameters': None, 'body': '{}', 'headers': {}}]
+    return [{
+        'httpMethod': test['method'],
+        'queryStringParameters': test.get('queryStringParameters'),
+        'body': json.dumps(test.get('body', {})),
+        'headers': {}
+    } for test in tests]
+
+
+def parse_imports(stderr: str) -> list:
+    """Разбор вывода python -X importtime: (накопительное время в мс, модуль)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative) / 1000, module.strip()))
+    return rows
+
+
+def heaviest_imports(stderr: str, top: int) -> list:
+    return sorted(parse_imports(stderr), reverse=True)[:top]
+
+
+def profile(name: str, stub_db: bool) -> dict:
+    path = os.path.join(BACKEND_DIR, name, 'index.py')
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE, path, json.dumps(probe_events(name)),
+         'stub' if stub_db else 'db'],
+        capture_output=True, text=True, env=os.environ.copy()
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f'{name}: {completed.stderr.strip().splitlines()[-1]}')
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['imports'] = completed.stderr
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('functions', nargs='*', default=list(FUNCTIONS))
+    parser.add_argument('--db', action='store_true', help='выполнять запросы к DATABASE_URL вместо пустой БД')
+    parser.add_argument('--top', type=int, default=0, help='показать N самых тяжёлых импортов')
+    parser.add_argument('--check', action='store_true', help='сравнить с бюджетом из startup_budget.json')
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE) as f:
+        budget = json.load(f)
+
+    failures = []
+    for name in args.functions:
+        result = profile(name, not args.db)
+        statuses = ','.join(str(status) for status in result['statuses'])
+        print(f'{name:<14} import={result["import_ms"]:7.1f}ms  '
+              f'first_request={result["first_request_ms"]:7.1f}ms  status={statuses}')
+        for cumulative, module in heaviest_imports(result['imports'], args.top):
+            print(f'    {cumulative:7.1f}ms  {module}')
+
+        if any(status is None or status >= 500 for status in result['statuses']):
+            failures.append(f'{name}: GET requests returned statuses {statuses}')
+        imported = {module for _, module in parse_imports(result['imports'])}
+        for deferred in budget.get('deferred_imports', {}).get(name, []):
+            if any(module == deferred or module.startswith(deferred + '.') for module in imported):
+                failures.append(f'{name}: {deferred} imported on cold start')
+        for metric in ('import_ms', 'first_request_ms'):
+            limit = budget[metric].get(name)
+            if limit is not None and result[metric] > limit:
+                failures.append(f'{name}: {metric} {result[metric]:.1f} > budget {limit}')
+
+    if args.check and failures:
+        print('\n'.join(['startup budget exceeded:'] + failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()